@@ -1,7 +1,8 @@
 """
 sandbox-runner.py — Isolated execution script.
 
-This script is run as a subprocess by sandbox.py.
+This script is run as a subprocess by sandbox.py, which pre-warms it and
+then pipes the user code in over stdin.
 It intercepts cv2.imshow() and captures the image as a base64 PNG,
 then prints it to stdout for the parent process to read.
 
@@ -18,6 +19,10 @@ import os
 import base64
 import tempfile
 
+# sandbox.py exchanges raw UTF-8 bytes with this script, whatever the locale
+sys.stdout.reconfigure(encoding="utf-8")
+sys.stderr.reconfigure(encoding="utf-8")
+
 # ── Import cv2 and numpy (these are allowed) ──────────────────────────────────
 
 import cv2
@@ -130,14 +135,20 @@ class _SandboxVideoCapture:
 cv2.VideoCapture = _SandboxVideoCapture
 
 # ── Read user code ────────────────────────────────────────────────────────────
+# Invoked as `sandbox-runner.py <code_file>`, or as `sandbox-runner.py -` to
+# read the code from stdin. sandbox.py uses `-` with pre-warmed runners:
+# everything above (cv2/numpy imports, patching) is already done by the time
+# the code arrives.
 
 if len(sys.argv) < 2:
     print("ERROR: No code file provided", file=sys.stderr)
     sys.exit(1)
 
-code_file = sys.argv[1]
-with open(code_file, "r") as f:
-    user_code = f.read()
+if sys.argv[1] == "-":
+    user_code = sys.stdin.buffer.read().decode("utf-8")
+else:
+    with open(sys.argv[1], "r") as f:
+        user_code = f.read()
 
 # ── Execute user code with restricted globals ─────────────────────────────────
 # The globals dict only exposes cv2 and numpy — user code cannot access
@@ -180,7 +191,8 @@ if _output_images:
         success, buf = cv2.imencode(".png", img)
         if success:
             b64 = base64.b64encode(buf.tobytes()).decode("utf-8")
-            print(f"IMAGE:{b64}")
+            # \x1e marks the image line for sandbox.py's rpartition split
+            print(f"\x1eIMAGE:{b64}")
         else:
             print("ERROR: Failed to encode image", file=sys.stderr)
     else:
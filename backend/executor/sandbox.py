@@ -6,19 +6,103 @@ Two execution modes:
 2. Local — runs code directly on the desktop with real camera access
 """
 
+import atexit
+import queue
+import re
+import select
 import subprocess
 import tempfile
 import os
 import sys
 import threading
+import time
 from pathlib import Path
 
 RUNNER_PATH = Path(__file__).parent / "sandbox-runner.py"
+# -I: isolated mode (no PYTHON* env vars, user site-packages or script dir on
+# sys.path); -B: no .pyc writes. -S is not used — cv2/numpy live in site-packages.
+_PYTHON_FLAGS = ("-I", "-B")
+_RUNNER_ARGV: tuple[str, ...] = (
+    sys.executable, *_PYTHON_FLAGS, str(RUNNER_PATH.resolve()), "-"
+)
 TIMEOUT_SECONDS = 10
+POOL_SIZE = 2  # Pre-warmed runner processes kept ready for sandboxed runs
+STALE_LIVE_FILE_SECONDS = 3600  # Leftover kata_live_* scripts older than this are removed
+SWEEP_INTERVAL_SECONDS = 60
+
+# The runner prints the image as its last stdout line behind an ASCII record
+# separator, so it can be split off without scanning the multi-MB payload.
+IMAGE_MARKER = b"\x1eIMAGE:"
 
 # Track active local processes so we can stop them
 _active_local_process: subprocess.Popen | None = None
 _active_local_lock = threading.Lock()
+_last_sweep_ts = 0.0
+# Serializes whole stop-then-launch sequences. run_local/stop_local are called
+# from worker threads, and without this two launches could each stop the
+# "previous" process and then both start, orphaning one of them.
+_local_launch_lock = threading.Lock()
+
+# A single reaper thread cleans up after every local process by waiting on
+# their pidfds in one epoll, instead of keeping a thread per launch.
+_reaper_epoll: "select.epoll | None" = None
+_reaper_procs: dict[int, tuple[subprocess.Popen, str]] = {}
+_reaper_lock = threading.Lock()
+
+# Idle runners that have already imported cv2/numpy and are blocked waiting
+# for user code on stdin. Each runner still executes exactly one
+# submission and exits, so every run keeps its own process boundary.
+_warm_runners: queue.Queue[subprocess.Popen] = queue.Queue()
+_warm_runners_lock = threading.Lock()
+_warm_runners_started = False
+
+
+def _spawn_runner() -> subprocess.Popen:
+    # close_fds=True even though it rules out posix_spawn: fds inherited from
+    # the launcher (uvicorn --fd, systemd socket activation) stay inheritable
+    # despite PEP 446, and learner code must never be able to reach them.
+    return subprocess.Popen(
+        _RUNNER_ARGV,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        close_fds=True,
+    )
+
+
+def _checkout_runner() -> subprocess.Popen:
+    """Take a pre-warmed runner from the pool and start its replacement."""
+    global _warm_runners_started
+    with _warm_runners_lock:
+        if not _warm_runners_started:
+            for _ in range(POOL_SIZE):
+                _warm_runners.put(_spawn_runner())
+            atexit.register(_shutdown_runners)
+            _warm_runners_started = True
+
+    try:
+        proc = _warm_runners.get_nowait()
+    except queue.Empty:
+        # More concurrent runs than warm runners — fall back to a cold start
+        return _spawn_runner()
+
+    # Best effort: if the replacement can't start (EMFILE, EAGAIN) the pool
+    # just shrinks by one, but the runner already taken is never lost
+    try:
+        _warm_runners.put(_spawn_runner())
+    except OSError:
+        pass
+    return proc
+
+
+def _shutdown_runners() -> None:
+    """Kill idle runners when the server exits."""
+    while True:
+        try:
+            proc = _warm_runners.get_nowait()
+        except queue.Empty:
+            return
+        proc.kill()
 
 
 def run_code(code: str) -> dict:
@@ -32,32 +116,44 @@ def run_code(code: str) -> dict:
             "error": str
         }
     """
-    # Write code to a temp file
-    with tempfile.NamedTemporaryFile(
-        mode="w", suffix=".py", delete=False, prefix="kata_"
-    ) as tmp:
-        tmp.write(code)
-        tmp_path = tmp.name
-
     try:
-        result = subprocess.run(
-            [sys.executable, str(RUNNER_PATH), tmp_path],
-            capture_output=True,
-            text=True,
-            timeout=TIMEOUT_SECONDS,
-        )
-
-        stdout = result.stdout.strip()
-        stderr = result.stderr.strip()
+        # Encode before checking out a runner so bad input (e.g. a lone
+        # surrogate) can't strand one blocked on stdin
+        code_bytes = code.encode("utf-8")
+        proc = _checkout_runner()
+        try:
+            # Code goes over stdin — nothing touches the filesystem
+            stdout, stderr = proc.communicate(code_bytes, timeout=TIMEOUT_SECONDS)
+        except BaseException:
+            # Timeout or anything else: never leave the runner behind
+            proc.kill()
+            proc.communicate()
+            raise
 
+        # Pipes carry raw UTF-8 bytes. Only the final line of a run where the
+        # runner itself reported no ERROR: can be its image, so a marker that
+        # user code printed before an empty/unencodable imshow stays in logs.
+        head, marker, image = stdout.rpartition(IMAGE_MARKER)
+        image = image.strip()
         image_b64 = None
+        runner_failed = any(
+            line.startswith(b"ERROR:") for line in stderr.splitlines()
+        )
+        if (marker and proc.returncode == 0 and not runner_failed
+                and (not head or head.endswith(b"\n")) and b"\n" not in image):
+            try:
+                image_b64 = image.decode("ascii")  # base64 needs no UTF-8 pass
+                stdout = head
+            except UnicodeDecodeError:
+                pass  # Not the runner's base64 — leave the line in the logs
+        stdout = stdout.decode("utf-8", "replace").strip()
+        stderr = stderr.decode("utf-8", "replace").strip()
+
         logs_lines = []
         error = ""
 
         for line in stdout.splitlines():
-            if line.startswith("IMAGE:"):
-                image_b64 = line[len("IMAGE:"):]
-            elif line.startswith("INFO:"):
+            if line.startswith("INFO:"):
                 logs_lines.append(line[len("INFO:"):])
             else:
                 logs_lines.append(line)
@@ -88,11 +184,6 @@ def run_code(code: str) -> dict:
             "logs": "",
             "error": f"Execution failed: {e}",
         }
-    finally:
-        try:
-            os.unlink(tmp_path)
-        except OSError:
-            pass
 
 
 def run_local(code: str) -> dict:
@@ -103,10 +194,17 @@ def run_local(code: str) -> dict:
     The process runs in the background — this function returns immediately.
     The OpenCV window appears on the user's desktop.
     """
+    with _local_launch_lock:
+        return _launch_local(code)
+
+
+def _launch_local(code: str) -> dict:
+    """run_local() body; caller holds _local_launch_lock."""
     global _active_local_process
 
     # Stop any previously running local process
-    stop_local()
+    _stop_local_process()
+    _sweep_stale_live_files()
 
     # Write code to a temp file (not auto-deleted — process needs it)
     tmp = tempfile.NamedTemporaryFile(
@@ -118,25 +216,17 @@ def run_local(code: str) -> dict:
 
     try:
         proc = subprocess.Popen(
-            [sys.executable, "-u", tmp_path],
+            [sys.executable, *_PYTHON_FLAGS, "-u", tmp_path],
+            # posix_spawn fast path. Unlike the sandbox runner this is the
+            # user's own code on their own desktop, so inherited fds are fine
+            close_fds=False,
         )
 
         with _active_local_lock:
             _active_local_process = proc
 
-        # Clean up temp file after process ends (in a background thread)
-        def _cleanup():
-            proc.wait()
-            with _active_local_lock:
-                global _active_local_process
-                if _active_local_process is proc:
-                    _active_local_process = None
-            try:
-                os.unlink(tmp_path)
-            except OSError:
-                pass
-
-        threading.Thread(target=_cleanup, daemon=True).start()
+        # Clean up temp file after process ends
+        _watch_local(proc, tmp_path)
 
         return {
             "image_b64": None,
@@ -146,10 +236,7 @@ def run_local(code: str) -> dict:
         }
 
     except Exception as e:
-        try:
-            os.unlink(tmp_path)
-        except OSError:
-            pass
+        _remove_quietly(tmp_path)
         return {
             "image_b64": None,
             "logs": "",
@@ -159,6 +246,12 @@ def run_local(code: str) -> dict:
 
 def stop_local() -> dict:
     """Stop the currently running local process (if any)."""
+    with _local_launch_lock:
+        return _stop_local_process()
+
+
+def _stop_local_process() -> dict:
+    """stop_local() body; caller holds _local_launch_lock."""
     global _active_local_process
     with _active_local_lock:
         proc = _active_local_process
@@ -166,28 +259,139 @@ def stop_local() -> dict:
 
     if proc and proc.poll() is None:
         proc.terminate()
-        try:
-            proc.wait(timeout=3)
-        except subprocess.TimeoutExpired:
+        if not _wait_pidfd(proc, 3):
             proc.kill()
         return {"stopped": True, "message": "Local process stopped."}
 
     return {"stopped": False, "message": "No local process was running."}
 
 
+def _watch_local(proc: subprocess.Popen, tmp_path: str) -> None:
+    """Arrange for _finish_local() to run once `proc` exits."""
+    global _reaper_epoll
+    try:
+        pidfd = os.pidfd_open(proc.pid)
+    except (AttributeError, OSError):
+        # No pidfd support (non-Linux, kernel < 5.3) — block a thread instead
+        threading.Thread(
+            target=_finish_local, args=(proc, tmp_path), daemon=True
+        ).start()
+        return
+
+    with _reaper_lock:
+        if _reaper_epoll is None:
+            _reaper_epoll = select.epoll()
+            threading.Thread(target=_reaper_loop, daemon=True).start()
+        _reaper_procs[pidfd] = (proc, tmp_path)
+        _reaper_epoll.register(pidfd, select.EPOLLIN)
+
+
+def _reaper_loop() -> None:
+    while True:
+        for pidfd, _ in _reaper_epoll.poll():
+            with _reaper_lock:
+                _reaper_epoll.unregister(pidfd)
+                proc, tmp_path = _reaper_procs.pop(pidfd)
+            os.close(pidfd)
+            _finish_local(proc, tmp_path)
+
+
+def _finish_local(proc: subprocess.Popen, tmp_path: str) -> None:
+    """Reap a finished local process and remove its temp script."""
+    global _active_local_process
+    proc.wait()
+    with _active_local_lock:
+        if _active_local_process is proc:
+            _active_local_process = None
+    _remove_quietly(tmp_path)
+
+
+def _sweep_stale_live_files() -> None:
+    """
+    Remove kata_live_* scripts orphaned by a server that exited while a local
+    process was still running. Runs at most once per SWEEP_INTERVAL_SECONDS.
+    Best effort: a failed sweep never stops the launch that triggered it.
+    """
+    global _last_sweep_ts
+    now = time.time()
+    with _active_local_lock:
+        if now - _last_sweep_ts < SWEEP_INTERVAL_SECONDS:
+            return
+        _last_sweep_ts = now
+
+    cutoff = now - STALE_LIVE_FILE_SECONDS
+    try:
+        with os.scandir(tempfile.gettempdir()) as entries:
+            for entry in entries:
+                if not (entry.name.startswith("kata_live_") and entry.name.endswith(".py")):
+                    continue
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.unlink(entry.path)
+                except OSError:
+                    pass
+    except OSError:
+        pass
+
+
+def _remove_quietly(path: str) -> None:
+    """Delete a temp script, ignoring it if it is already gone."""
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def _wait_pidfd(proc: subprocess.Popen, timeout: float) -> bool:
+    """
+    Wait up to `timeout` seconds for `proc` to exit. Returns True if it did.
+
+    On Linux this blocks on a pidfd until the kernel reports the exit, instead
+    of Popen.wait(timeout=)'s sleep-and-waitpid loop. Falls back to
+    Popen.wait() where pidfd_open is unavailable (non-Linux, kernel < 5.3).
+    """
+    if proc.returncode is not None:
+        return True
+    try:
+        pidfd = os.pidfd_open(proc.pid)
+    except (AttributeError, OSError):
+        try:
+            proc.wait(timeout=timeout)
+            return True
+        except subprocess.TimeoutExpired:
+            return False
+
+    try:
+        poller = select.poll()
+        poller.register(pidfd, select.POLLIN)
+        if not poller.poll(timeout * 1000):
+            return False
+    finally:
+        os.close(pidfd)
+    proc.wait()  # Already exited — just reap it
+    return True
+
+
+_ERROR_RE = re.compile(
+    r"(?P<import>ImportError|ModuleNotFoundError)"
+    r"|(?P<syntax>SyntaxError)"
+    r"|(?P<name>NameError)"
+    r"|(?P<type>TypeError)"
+    r"|(?P<attr>AttributeError)"
+)
+_ERROR_MESSAGES = {
+    "import": "🚫 Import blocked: {}\n"
+              "Only `import cv2` and `import numpy as np` are allowed.",
+    "syntax": "✏️ Syntax error in your code: {}",
+    "name": "❓ Name not found: {}\nDid you define this variable?",
+    "type": "🔧 Type error: {}",
+    "attr": "🔍 Attribute error: {}\nCheck the OpenCV function name.",
+}
+
+
 def _make_friendly_error(raw: str) -> str:
     """Convert cryptic Python errors into learner-friendly messages."""
-    if "ImportError" in raw or "ModuleNotFoundError" in raw:
-        return (
-            f"🚫 Import blocked: {raw}\n"
-            "Only `import cv2` and `import numpy as np` are allowed."
-        )
-    if "SyntaxError" in raw:
-        return f"✏️ Syntax error in your code: {raw}"
-    if "NameError" in raw:
-        return f"❓ Name not found: {raw}\nDid you define this variable?"
-    if "TypeError" in raw:
-        return f"🔧 Type error: {raw}"
-    if "AttributeError" in raw:
-        return f"🔍 Attribute error: {raw}\nCheck the OpenCV function name."
+    match = _ERROR_RE.search(raw)
+    if match:
+        return _ERROR_MESSAGES[match.lastgroup].format(raw)
     return f"❌ Error: {raw}"
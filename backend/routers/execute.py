@@ -4,15 +4,49 @@ POST /api/execute — run user code (sandboxed or locally).
 POST /api/execute/stop — stop a running local process.
 """
 
-from fastapi import APIRouter
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
 from backend.models.schemas import ExecuteRequest, ExecuteResult
 from backend.executor.sandbox import run_code, run_local, stop_local
 
 router = APIRouter(prefix="/api/execute", tags=["execute"])
 
+MAX_CONCURRENT_RUNS = 8   # Sandboxed runs executing at once
+MAX_QUEUED_RUNS = 16      # Runs allowed to wait for a slot before we reply 429
+
+# run_code blocks for up to TIMEOUT_SECONDS, so it runs on a bounded thread
+# pool to keep the event loop free and cap how many runners execute at once
+# (the executor's POOL_SIZE idle warm runners come on top of this).
+_run_pool = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_RUNS, thread_name_prefix="kata")
+_run_slots = asyncio.Semaphore(MAX_CONCURRENT_RUNS)
+_pending_runs = 0  # Running + waiting; only touched from the event loop
+
+
+async def _run_sandboxed(code: str) -> dict:
+    global _pending_runs
+    if _pending_runs >= MAX_CONCURRENT_RUNS + MAX_QUEUED_RUNS:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many code runs in progress. Please try again in a moment.",
+        )
+
+    _pending_runs += 1
+    try:
+        async with _run_slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(_run_pool, run_code, code)
+    finally:
+        _pending_runs -= 1
+
 
+# response_model only documents the shape: the executor already returns exactly
+# ExecuteResult's fields, so the result is sent as-is without re-validating a
+# (possibly multi-MB) image_b64 string.
 @router.post("", response_model=ExecuteResult)
-async def execute_code(req: ExecuteRequest) -> ExecuteResult:
+async def execute_code(req: ExecuteRequest) -> JSONResponse:
     """
     Accept user Python/OpenCV code and run it.
 
@@ -20,18 +54,18 @@ async def execute_code(req: ExecuteRequest) -> ExecuteResult:
     - local=True: launches on desktop with real camera, returns immediately.
     """
     if req.local:
-        result = run_local(req.code)
+        # Not gated and kept off _run_pool, so a stop/relaunch never queues
+        # behind sandboxed runs; run_local serializes launches itself, so at
+        # most one local process is alive
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, run_local, req.code)
     else:
-        result = run_code(req.code)
+        result = await _run_sandboxed(req.code)
 
-    return ExecuteResult(
-        image_b64=result.get("image_b64"),
-        logs=result.get("logs", ""),
-        error=result.get("error", ""),
-    )
+    return JSONResponse(result)
 
 
 @router.post("/stop")
-async def stop_execution():
+def stop_execution():
     """Stop a running local camera process."""
     return stop_local()